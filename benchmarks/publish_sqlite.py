@@ -0,0 +1,77 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+# gendoc: ignore
+"""
+Compares the ways of publishing a solution table in a local SQLite database:
+
+    * legacy: row tuples built from the whole table, then a single executemany,
+      as the former OplModel._to_sql did
+    * batched: OplModel.to_sql without the bulk fast path
+    * bulk: OplModel.to_sql with the SQLite fast path (synchronous writes off)
+
+The table is synthetic, so no .mod file is needed::
+
+    python benchmarks/publish_sqlite.py --rows 1000000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from doopl.publish import _publish_columns
+
+
+def make_columns(rows, symbols):
+    rng = np.random.RandomState(0)
+    labels = ["id", "site", "qty"]
+    sites = pd.Categorical.from_codes(rng.randint(0, symbols, rows),
+                                      ["site%d" % i for i in range(symbols)])
+    return labels, [np.arange(rows, dtype=np.int64), sites, rng.rand(rows)]
+
+
+def legacy(con, table, labels, arrays):
+    rows = [tuple(r) for r in zip(*(np.asarray(a, dtype=object).tolist() for a in arrays))]
+    con.execute("DELETE FROM {0:s}".format(table))
+    con.executemany("INSERT INTO {0:s} VALUES ({1:s})".format(table, ",".join(["?"] * len(labels))), rows)
+    con.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    labels, arrays = make_columns(args.rows, args.symbols)
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        con = sqlite3.connect(path)
+        con.execute("CREATE TABLE assignment (id INTEGER, site TEXT, qty REAL)")
+        con.commit()
+        runs = [("legacy", lambda: legacy(con, "assignment", labels, arrays)),
+                ("batched", lambda: _publish_columns(con, "assignment", labels, arrays, args.batch_size, bulk=False)),
+                ("bulk", lambda: _publish_columns(con, "assignment", labels, arrays, args.batch_size, bulk=True))]
+        for name, run in runs:
+            start = time.time()
+            written = run()
+            elapsed = time.time() - start
+            print("{0:8s} {1:10d} rows {2:8.3f} s {3:12.0f} rows/s".format(name, written, elapsed, written / elapsed))
+        con.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
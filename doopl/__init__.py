@@ -57,7 +57,7 @@ DYLD_LIBRARY_PATH, depending on your platform. They are located in
 
 Here is small sumup of the capabilities:
 
-   * Inputs can be tuple lists, panda's dataframe, sql alchemy fetch statements.
+   * Inputs can be tuple lists, panda's dataframe, pyarrow tables, sql alchemy fetch statements.
    * Generate, solve and get output tuplesets as panda's dataframe
    * Get the CPLEX problem statistics and quality metrics for the solution
    * Convert all integer variables to floating point variables and vice-versa.
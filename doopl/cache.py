@@ -0,0 +1,160 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+# gendoc: ignore
+"""
+The cache of converted inputs, see InputCache. This does not need the OPL libraries.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from doopl.columns import _is_arrow, pa
+
+
+def _hash_column(h, values):
+    if isinstance(values, pd.Series):
+        values = values.values
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        h.update(str(values.dtype).encode())
+        h.update(np.ascontiguousarray(values).view(np.uint8))
+        return
+    values = np.asarray(values, dtype=object)
+    # hash_array hashes the str() of values which are not str, so 1 and '1' hash the same:
+    # the inferred type, and the type of each value for mixed columns, are hashed too
+    inferred = pd.api.types.infer_dtype(values, skipna=False)
+    h.update(inferred.encode())
+    if inferred.startswith("mixed"):
+        types = np.empty(len(values), dtype=object)
+        types[:] = [type(v).__name__ for v in values]
+        h.update(pd.util.hash_array(types).view(np.uint8))
+    h.update(pd.util.hash_array(values).view(np.uint8))
+
+
+def _hash_arrow_array(h, array):
+    h.update(("%s:%d:%d" % (array.type, array.offset, len(array))).encode())
+    for buf in array.buffers():
+        if buf is not None:
+            h.update(buf)
+    _hash_arrow_dictionaries(h, array)
+
+
+def _hash_arrow_dictionaries(h, array):
+    """ Hashes the dictionaries of an array, which are not part of its buffers, at any depth."""
+    t = array.type
+    if pa.types.is_dictionary(t):
+        _hash_arrow_array(h, array.dictionary)
+    elif pa.types.is_struct(t):
+        for i in range(0, t.num_fields):
+            _hash_arrow_dictionaries(h, array.field(i))
+    elif pa.types.is_list(t) or pa.types.is_large_list(t) or pa.types.is_fixed_size_list(t):
+        _hash_arrow_dictionaries(h, array.values)
+
+
+def _input_fingerprint(value):
+    """ Returns a digest of the content of an input, or None if the input
+    cannot be fingerprinted without consuming it."""
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(value, pd.DataFrame):
+        h.update(b"frame")
+        for label in value.columns:
+            h.update(repr(label).encode("utf-8"))
+        for c in range(0, len(value.columns)):
+            _hash_column(h, value.iloc[:, c])
+    elif _is_arrow(value):
+        if isinstance(value, pa.RecordBatchReader):
+            return None
+        h.update(b"arrow")
+        h.update(str(value.schema).encode("utf-8"))
+        for column in value.columns:
+            chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+            for chunk in chunks:
+                _hash_arrow_array(h, chunk)
+    elif hasattr(value, "_fingerprint"):
+        # file inputs are identified by their path, modification time and size
+        h.update(value._fingerprint().encode("utf-8"))
+    else:
+        # lists are not cached: hashing their rows costs as much as converting them
+        return None
+    return h.hexdigest()
+
+
+def _columns_nbytes(bycolumn):
+    size = 0
+    for col in bycolumn:
+        if isinstance(col, pd.Categorical):
+            size += col.codes.nbytes + col.categories.memory_usage(deep=True)
+        else:
+            size += col.nbytes
+    return size
+
+
+class InputCache(object):
+    """ A size bounded LRU cache of converted input tuple sets, shared by all the models.
+    Inputs whose content did not change since a previous run (same dataframe or arrow
+    content, same file modification time) are not converted again. Lists and row
+    iterables are not cached.
+
+    The cache is disabled until max_bytes is set to a positive value::
+
+        from doopl.factory import input_cache
+        input_cache.max_bytes = 2 * 1024 ** 3
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """ The size in bytes of the cached buffers."""
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, bycolumn):
+        size = _columns_nbytes(bycolumn)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[key] = (bycolumn, size)
+            self._nbytes += size
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+
+    def clear(self):
+        """ Empties the cache and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+input_cache = InputCache()
@@ -0,0 +1,114 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+# gendoc: ignore
+"""
+Helpers on the column buffers of tuple sets (numpy arrays for numeric fields,
+categoricals or object arrays for string fields). They do not need the OPL libraries.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+OPL_INTEGER = 1
+OPL_FLOAT = 2
+OPL_STRING = 3
+
+
+def _is_arrow(value):
+    return pa is not None and isinstance(value, (pa.Table, pa.RecordBatch, pa.RecordBatchReader))
+
+
+def _take_rows(col, mask):
+    if isinstance(col, pd.Series):
+        col = col.values
+    if isinstance(col, list):
+        col = np.asarray(col, dtype=object)
+    return col[mask]
+
+
+def _columns_frame(bycolumn):
+    return pd.DataFrame(OrderedDict(enumerate(bycolumn)), copy=False)
+
+
+def _row_mask(bycolumn, delta, positions):
+    """ Returns a boolean mask of the rows of bycolumn matching a row of delta on
+    the given column positions. Rows are compared through vectorized hashes, and
+    the (few) candidate rows are then checked exactly."""
+    left = _columns_frame(bycolumn).iloc[:, positions]
+    right = _columns_frame(delta).iloc[:, positions]
+    mask = np.isin(pd.util.hash_pandas_object(left, index=False).values,
+                   pd.util.hash_pandas_object(right, index=False).values)
+    if mask.any():
+        rows = set(right.astype(object).itertuples(index=False, name=None))
+        candidates = left[mask].astype(object).itertuples(index=False, name=None)
+        mask[mask] = np.fromiter((r in rows for r in candidates), dtype=bool, count=int(mask.sum()))
+    return mask
+
+
+def _append_columns(bycolumn, delta, fields):
+    """ Appends the rows of delta to bycolumn (both as returned by _cacheable_columns).
+    String columns are merged at the category level: existing codes are kept."""
+    ret = []
+    for col, extra, ctype in zip(bycolumn, delta, fields):
+        if ctype == OPL_STRING:
+            categories = col.categories.append(extra.categories.difference(col.categories, sort=False))
+            mapping = categories.get_indexer(extra.categories)
+            codes = np.where(extra.codes < 0, -1, mapping.take(extra.codes))
+            ret.append(pd.Categorical.from_codes(np.concatenate([col.codes, codes]), categories))
+        else:
+            ret.append(np.concatenate([col, extra]))
+    return ret
+
+
+def _apply_changes(bycolumn, fields, changes, key_positions=None):
+    """ Applies a list of ("inserted"|"deleted"|"updated", delta columns) changes to
+    the columns of a tuple set. Updated rows replace the rows with the same key: like
+    inserted rows, they are appended at the end, so the order of the rows changes."""
+    for kind, delta in changes:
+        if kind != "inserted":
+            positions = key_positions if kind == "updated" else list(range(0, len(fields)))
+            mask = _row_mask(bycolumn, delta, positions)
+            if mask.any():
+                bycolumn = [_take_rows(col, ~mask) for col in bycolumn]
+        if kind != "deleted":
+            bycolumn = _append_columns(bycolumn, delta, fields)
+    return bycolumn
+
+
+def _iter_chunks(labels, arrays, chunk_rows, categorical=False, as_arrow=False, allow_empty=False):
+    """ Yields dataframes or record batches of at most chunk_rows rows, sliced from the compact
+    columns returned by OplModel._fetch_compact_columns. If allow_empty is True, an empty table
+    yields one empty chunk."""
+    size = len(arrays[0]) if arrays else 0
+    for start in range(0, max(size, 1) if allow_empty else size, chunk_rows):
+        stop = min(start + chunk_rows, size)
+        chunk = []
+        for a in arrays:
+            part = a[start:stop]
+            if isinstance(part, pd.Categorical):
+                if as_arrow:
+                    part = pa.DictionaryArray.from_arrays(part.codes, pa.array(part.categories.values)) \
+                        if categorical else pa.array(np.asarray(part, dtype=object), type=pa.string())
+                elif not categorical:
+                    part = np.asarray(part, dtype=object)
+            elif as_arrow:
+                part = pa.array(part)
+            chunk.append(part)
+        if as_arrow:
+            yield pa.RecordBatch.from_arrays(chunk, labels)
+        else:
+            df = pd.DataFrame(OrderedDict(enumerate(chunk)), copy=False)
+            df.columns = labels
+            df.index = pd.RangeIndex(start, stop)
+            yield df
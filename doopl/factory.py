@@ -5,15 +5,33 @@
 # --------------------------------------------------------------------------
 
 from doopl.opl import *
+import json
+import os
+import re
+import tempfile
+import numpy as np
 import pandas as pd
 from six import iteritems, PY2
 from collections import OrderedDict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 from contextlib import contextmanager
 
-OPL_INTEGER = 1
-OPL_FLOAT = 2
-OPL_STRING = 3
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from doopl.columns import OPL_INTEGER, OPL_FLOAT, OPL_STRING
+from doopl.columns import _take_rows, _apply_changes, _iter_chunks
+from doopl.columns import _is_arrow
+from doopl.cache import InputCache, input_cache, _input_fingerprint
+from doopl.publish import _publish_columns, _publish_job, _publish_delta, _is_single_connection
 
 
 @contextmanager
@@ -40,7 +58,7 @@ def create_opl_model(model, data=None):
 
     opl = _env._createOplModel(_modelSource)
 
-    ret = OplModel(_env, opl, _filename)
+    ret = OplModel(_env, opl, _filename, _modelSource)
     if data is not None:
         if isinstance(data, str):
             ret.set_input(data)
@@ -56,6 +74,651 @@ def create_opl_model(model, data=None):
         ret.end()
 
 
+def _numeric_column(values, ftype):
+    """ Returns a contiguous int64/float64 buffer for a numeric column.
+    No copy is made when the values already have the expected layout."""
+    dtype = np.int64 if ftype == OPL_INTEGER else np.float64
+    return np.ascontiguousarray(values, dtype=dtype)
+
+
+def _to_symbol(v):
+    if isinstance(v, str):
+        return v
+    # noinspection PyUnresolvedReferences
+    if PY2 and isinstance(v, unicode):
+        return str(v).encode("utf-8")
+    return str(v)
+
+
+def _symbol_codes(values):
+    """ Factorizes the values of a string column which is not a categorical.
+    Only columns made of str only are factorized as is: factorize compares values
+    with ==, which would merge distinct symbols such as 1, 1.0 and True, or None
+    and nan. Other columns are converted value by value first."""
+    values = np.asarray(values, dtype=object)
+    if pd.api.types.infer_dtype(values, skipna=False) not in ("string", "empty"):
+        symbols = np.empty(len(values), dtype=object)
+        symbols[:] = [_to_symbol(v) for v in values]
+        values = symbols
+    return pd.factorize(values)
+
+
+def _string_column(values):
+    """ Returns the values of a string column as a list of str.
+    The column is factorized first (categoricals are used as is) so that each
+    distinct value is converted only once, and all rows holding that value
+    share the same string object."""
+    if isinstance(values, pd.Series):
+        values = values.values
+    if isinstance(values, pd.Categorical):
+        codes, uniques = values.codes, values.categories
+    else:
+        codes, uniques = _symbol_codes(values)
+    # missing values have code -1 and pick the trailing 'nan' symbol
+    symbols = np.empty(len(uniques) + 1, dtype=object)
+    symbols[:-1] = [_to_symbol(u) for u in uniques]
+    symbols[-1] = "nan"
+    return symbols.take(codes).tolist()
+
+
+def _checked_numeric_column(name, label, values, ctype, downcast=False):
+    """ Checks a numeric column in one vectorized pass and returns it as an
+    int64/float64 buffer.
+    Integer fields reject missing, infinite and (unless downcast is set)
+    non integral values."""
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    values = np.asarray(values)
+    if values.dtype.kind not in "biuf":
+        if pd.api.types.infer_dtype(values, skipna=True) not in _NUMERIC_INFERRED_TYPES:
+            message = 'Column %s of input %s is not numeric (%s)' % (label, name, values.dtype)
+            raise OplRuntimeException(message)
+        values = np.asarray(pd.to_numeric(values))
+    if ctype == OPL_INTEGER and values.dtype.kind == "f":
+        if not np.isfinite(values).all():
+            message = 'Column %s of input %s is an int column with missing or infinite values' % (label, name)
+            raise OplRuntimeException(message)
+        if not downcast and (values != np.trunc(values)).any():
+            message = 'Column %s of input %s is an int column with non integer values' % (label, name)
+            raise OplRuntimeException(message)
+        if len(values) and (values.min() < -_INT64_BOUND or values.max() >= _INT64_BOUND):
+            message = 'Column %s of input %s is an int column with values out of the 64 bits range' % (label, name)
+            raise OplRuntimeException(message)
+    elif ctype == OPL_INTEGER and values.dtype.kind == "u" and len(values) and values.max() >= _INT64_BOUND:
+        message = 'Column %s of input %s is an int column with values out of the 64 bits range' % (label, name)
+        raise OplRuntimeException(message)
+    return _numeric_column(values, ctype)
+
+
+# 2**63, exactly representable as a float
+_INT64_BOUND = 2 ** 63
+
+_NUMERIC_INFERRED_TYPES = {"integer", "floating", "mixed-integer-float", "decimal", "boolean", "empty"}
+
+
+def _flat_field_names(schema):
+    """ Returns the names of the leaf fields of a tuple schema, used both to match input
+    columns and to name output columns, so that a table read from OPL can be set back as
+    an input. The fields of a sub tuple are prefixed by the name of the column holding
+    it, e.g. 'origin.id'."""
+    names = []
+    hasSubTuple = schema._hasSubTuple()
+    for i in range(0, schema.getSize()):
+        if hasSubTuple and schema._isTuple(i):
+            prefix = schema.getColumnName(i) + "."
+            names.extend(prefix + n for n in _flat_field_names(schema._getTupleColumn(i)))
+        else:
+            names.append(schema.getColumnName(i))
+    return names
+
+
+def _column_positions(name, names, fields, columns):
+    """ Returns the position in columns of each tuple field.
+    Columns are matched by name. They are matched by position only when no column
+    is named after a tuple field (e.g. a default RangeIndex), in which case the column
+    count must match. An OplRuntimeException lists the missing fields otherwise."""
+    columns = list(columns)
+    if len(names) == len(fields):
+        index = {}
+        for i, c in enumerate(columns):
+            index.setdefault(c, i)
+        missing = [n for n in names if n not in index]
+        if not missing:
+            return [index[n] for n in names]
+        if len(missing) != len(names):
+            message = 'Input %s has no column for fields %s, expected = %s, data = %s' % (
+                name, missing, names, columns)
+            raise OplRuntimeException(message)
+    _check_column_count(name, names, fields, columns)
+    return list(range(0, len(fields)))
+
+
+def _dataframe_columns(name, df, fields, positions, downcast=False):
+    """ Extracts the columns of a dataframe, numeric columns as numpy buffers.
+    Columns are selected one by one, so reordering does not copy the frame."""
+    bycolumn = []
+    for c, ctype in enumerate(fields):
+        series = df.iloc[:, positions[c]]
+        if ctype == OPL_STRING:
+            bycolumn.append(series.values)
+        else:
+            bycolumn.append(_checked_numeric_column(name, series.name, series, ctype, downcast))
+    return bycolumn
+
+
+def _arrow_table(value):
+    if isinstance(value, pa.RecordBatchReader):
+        return value.read_all()
+    if isinstance(value, pa.RecordBatch):
+        return pa.Table.from_batches([value])
+    return value
+
+
+def _flatten_structs(table):
+    """ Flattens struct columns (at any depth) into 'parent.child' columns."""
+    while any(pa.types.is_struct(t) for t in table.schema.types):
+        table = table.flatten()
+    return table
+
+
+def _arrow_columns(name, table, fields, positions, downcast=False):
+    """ Extracts the columns of a pyarrow table.
+    Numeric columns made of a single chunk of the expected type are exposed
+    without copy. String columns are dictionary encoded (or used as is when
+    they already are) so that each dictionary entry is converted only once."""
+    table = table.unify_dictionaries()
+    bycolumn = []
+    for c, ctype in enumerate(fields):
+        column = table.column(positions[c])
+        if ctype == OPL_STRING:
+            if not pa.types.is_dictionary(column.type):
+                column = column.dictionary_encode()
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        if ctype == OPL_STRING:
+            codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            bycolumn.append(pd.Categorical.from_codes(codes, column.dictionary.to_pylist()))
+        else:
+            label = table.column_names[positions[c]]
+            values = column.to_numpy(zero_copy_only=False)
+            bycolumn.append(_checked_numeric_column(name, label, values, ctype, downcast))
+    return bycolumn
+
+
+_FILE_FORMATS = {".parquet": "parquet", ".pq": "parquet", ".csv": "csv"}
+
+
+def _file_format(path):
+    for extension, fmt in iteritems(_FILE_FORMATS):
+        if path.lower().endswith(extension):
+            return fmt
+    return None
+
+
+def _read_file(path, fmt, names, fields):
+    """ Reads the columns named after the tuple schema from a parquet or csv file,
+    in schema order. Returns a pyarrow table, or a pandas dataframe when the csv
+    is read without pyarrow."""
+    if fmt == "parquet":
+        if pa is None:
+            raise OplRuntimeException("pyarrow is required to read parquet file {0}".format(path))
+        import pyarrow.parquet as pq
+        # sub tuple fields are read as flat 'origin.id' columns (as written by write_tables)
+        # when the file has them, through their top level struct column otherwise
+        top_level = set(pq.read_schema(path, memory_map=True).names)
+        roots = []
+        for n in names:
+            root = n if n in top_level else n.split(".")[0]
+            if root not in roots:
+                roots.append(root)
+        return _flatten_structs(pq.read_table(path, columns=roots, memory_map=True)).select(names)
+    if pa is not None:
+        import pyarrow.csv as pcsv
+        types = {OPL_INTEGER: pa.int64(), OPL_FLOAT: pa.float64(), OPL_STRING: pa.string()}
+        options = pcsv.ConvertOptions(include_columns=names,
+                                      column_types=dict(zip(names, (types[f] for f in fields))))
+        with pa.memory_map(path, "r") as source:
+            return pcsv.read_csv(source, convert_options=options)
+    dtypes = dict((n, str) for n, f in zip(names, fields) if f == OPL_STRING)
+    return pd.read_csv(path, usecols=names, dtype=dtypes)[names]
+
+
+def _iter_batches(rows, batch_size):
+    """ Yields lists of at most batch_size rows, using fetchmany when available."""
+    fetchmany = getattr(rows, "fetchmany", None)
+    if fetchmany is not None:
+        while True:
+            batch = fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+    else:
+        it = iter(rows)
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                break
+            yield batch
+
+
+def _stream_columns(name, rows, names, fields, batch_size, downcast=False):
+    """ Reads rows by batches and accumulates them in compact column buffers.
+    Numeric columns are stored as int64/float64 chunks, string columns as
+    int32 codes over a shared symbol table, so only one batch of python rows
+    is alive at a time. Numeric batches are checked like dataframe columns."""
+    chunks = [[] for _ in fields]
+    symbols = [OrderedDict() if ctype == OPL_STRING else None for ctype in fields]
+    for batch in _iter_batches(rows, batch_size):
+        for c, col in enumerate(zip(*batch)):
+            ctype = fields[c]
+            if ctype == OPL_STRING:
+                codes, uniques = _symbol_codes(col)
+                table = symbols[c]
+                remap = [table.setdefault(_to_symbol(u), len(table)) for u in uniques]
+                if (codes < 0).any():
+                    remap.append(table.setdefault("nan", len(table)))
+                chunks[c].append(np.asarray(remap, dtype=np.int32).take(codes))
+            else:
+                chunks[c].append(_checked_numeric_column(name, names[c], col, ctype, downcast))
+        batch = None
+    bycolumn = []
+    for c, ctype in enumerate(fields):
+        if ctype == OPL_STRING:
+            codes = np.concatenate(chunks[c]) if chunks[c] else np.empty(0, dtype=np.int32)
+            bycolumn.append(pd.Categorical.from_codes(codes, list(symbols[c])))
+        elif chunks[c]:
+            bycolumn.append(np.concatenate(chunks[c]))
+        else:
+            bycolumn.append(_numeric_column([], ctype))
+        chunks[c] = None
+    return bycolumn
+
+
+def _deduplicate(name, names, bycolumn, keys=None):
+    """ Drops the duplicate rows of prepared columns, with vectorized hashing.
+    If key field names are given, raises an OplRuntimeException when distinct rows
+    share the same key."""
+    frame = pd.DataFrame(OrderedDict(enumerate(bycolumn)), copy=False)
+    unique = ~frame.duplicated().values
+    if keys:
+        missing = [k for k in keys if k not in names]
+        if missing:
+            message = 'Unknown key fields %s for input %s, fields are %s' % (missing, name, names)
+            raise OplRuntimeException(message)
+        positions = [names.index(k) for k in keys]
+        rows = frame[unique]
+        conflicts = rows.duplicated(subset=positions, keep=False).values
+        if conflicts.any():
+            sample = rows[conflicts].iloc[:, positions].drop_duplicates().head(5)
+            message = 'Input %s has %d rows with duplicate keys %s, e.g. %s' % (
+                name, conflicts.sum(), list(keys), [tuple(r) for r in sample.itertuples(index=False)])
+            raise OplRuntimeException(message)
+    if unique.all():
+        return bycolumn
+    return [_take_rows(col, unique) for col in bycolumn]
+
+
+_row_writer_factories = {}
+
+
+def _row_writer(cells, fields):
+    """ Returns a function writing a row into cells with the typed setters of each
+    column (setIntValue, setNumValue, setStringValue). The code is generated once per
+    list of column types and cached, so there is no per cell type dispatch."""
+    key = tuple(fields)
+    make = _row_writer_factories.get(key, None)
+    if make is None:
+        variables = ", ".join("c%d" % i for i in range(0, len(key)))
+        lines = ["def make(cells, to_symbol):",
+                 "    setInt = cells.setIntValue",
+                 "    setNum = cells.setNumValue",
+                 "    setString = cells.setStringValue",
+                 "    def write(row):",
+                 "        (%s,) = row" % variables]
+        for i, ctype in enumerate(key):
+            if ctype == OPL_INTEGER:
+                lines.append("        setInt(%d, int(c%d))" % (i, i))
+            elif ctype == OPL_FLOAT:
+                lines.append("        setNum(%d, float(c%d))" % (i, i))
+            else:
+                lines.append("        setString(%d, to_symbol(c%d))" % (i, i))
+        lines.append("    return write")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        make = namespace["make"]
+        _row_writer_factories[key] = make
+    return make(cells, _to_symbol)
+
+
+def _set_column(setter, index, values, size):
+    if isinstance(values, np.ndarray):
+        try:
+            setter(index, values, size)
+            return
+        except TypeError:
+            # wrappers built without buffer support only accept sequences
+            values = values.tolist()
+    setter(index, values, size)
+
+
+# noinspection PyUnresolvedReferences
+def _fill_tuple_set(tupleset, fields, bycolumn, executor=None):
+    """ Pushes column buffers to a tuple set. With an executor, the symbols of the
+    string columns are converted in parallel, native calls stay in the calling thread."""
+    size = len(bycolumn[0])
+    strings = {}
+    if executor is not None:
+        positions = [c for c, ctype in enumerate(fields) if ctype == OPL_STRING]
+        if len(positions) > 1:
+            strings = dict(zip(positions, executor.map(_string_column, [bycolumn[c] for c in positions])))
+    for c, ctype in enumerate(fields):
+        col = bycolumn[c]
+        if ctype == OPL_INTEGER:
+            _set_column(tupleset.setIntColumnValues, c, col, size)
+        elif ctype == OPL_FLOAT:
+            _set_column(tupleset.setNumColumnValues, c, col, size)
+        else:
+            values = strings.pop(c, None)
+            if values is None:
+                values = _string_column(col)
+            tupleset.setStringColumnValues(c, values, size)
+            values = None
+    tupleset.fillTupleHash()
+
+
+def _check_column_count(name, names, fields, columns):
+    # if schema.getSize() != len(columns):
+    if len(fields) != len(columns):
+        message = 'Column mistmatch, input name=%s, expected = %s, data = %s' % (
+        name, names, [n for n in columns])
+        raise OplRuntimeException(message)
+
+
+def _cacheable_columns(bycolumn, fields):
+    """ Turns prepared columns into self contained buffers:
+    numpy arrays for numeric columns, categoricals for string columns.
+    The buffers are copies, prepared columns may be views of the caller's data
+    which can be modified after the run."""
+    ret = []
+    for col, ctype in zip(bycolumn, fields):
+        if ctype == OPL_STRING:
+            if isinstance(col, pd.Series):
+                col = col.values
+            if isinstance(col, pd.Categorical):
+                col = col.copy()
+            else:
+                codes, uniques = _symbol_codes(col)
+                col = pd.Categorical.from_codes(codes, uniques)
+            ret.append(col)
+        else:
+            dtype = np.int64 if ctype == OPL_INTEGER else np.float64
+            ret.append(np.array(col, dtype=dtype, copy=True))
+    return ret
+
+
+def _dat_string(v):
+    return '"' + _to_symbol(v).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _dat_items(values):
+    """ Formats a 1-d array of primitive values as .dat literals, in one pass per array."""
+    values = np.asarray(values)
+    if values.dtype.kind == "b":
+        values = values.astype(np.int64)
+    if values.dtype.kind in "iu":
+        return values.astype(str).tolist()
+    if values.dtype.kind == "f":
+        if not np.isfinite(values).all():
+            raise OplRuntimeException("Missing or infinite values cannot be passed to OPL")
+        return [repr(v) for v in values.tolist()]
+    return [_dat_string(v) for v in values.tolist()]
+
+
+def _dat_scalar(v):
+    return _dat_items([v])[0]
+
+
+def _dat_array(values):
+    if values.ndim == 1:
+        return "[" + ", ".join(_dat_items(values)) + "]"
+    return "[" + ",\n".join(_dat_array(sub) for sub in values) + "]"
+
+
+def _dat_value(name, value):
+    """ Returns the .dat representation of a scalar, a set, a range or an array.
+    Sets are written sorted, so that the order of the OPL set does not depend on the process.
+    Arrays given as numpy arrays or (nested) lists are written by position, pandas
+    series and dicts are written with their index as keys."""
+    if isinstance(value, dict):
+        value = pd.Series(value)
+    if isinstance(value, pd.Series):
+        if isinstance(value.index, pd.MultiIndex):
+            raise OplRuntimeException("{0}: multi indexed series are not supported, use a nested array".format(name))
+        keys = _dat_items(value.index.values)
+        items = _dat_items(value.values)
+        return "#[" + ", ".join("%s: %s" % kv for kv in zip(keys, items)) + "]#"
+    if isinstance(value, range):
+        if value.step != 1 or len(value) == 0:
+            raise OplRuntimeException("{0}: only non empty ranges with step 1 are supported".format(name))
+        return "%d..%d" % (value.start, value.stop - 1)
+    if isinstance(value, (set, frozenset)):
+        # the iteration order of a set of str changes between processes (hash randomization)
+        try:
+            items = sorted(value)
+        except TypeError:
+            raise OplRuntimeException("{0}: the values of a set must have the same type".format(name))
+        return "{" + ", ".join(_dat_items(items)) + "}"
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return _dat_array(np.asarray(value))
+    return _dat_scalar(value)
+
+
+def _write_dat(elements):
+    """ Writes the python data elements to a temporary .dat file and returns its path."""
+    fd, path = tempfile.mkstemp(suffix=".dat", prefix="doopl")
+    with os.fdopen(fd, "w") as f:
+        for name, value in iteritems(elements):
+            f.write("%s = %s;\n" % (name, _dat_value(name, value)))
+    return path
+
+
+def _select_columns(schema, names, fields, columns=None):
+    """ Returns the indices of the given column names, or of all the columns."""
+    if columns is None:
+        return list(range(0, len(fields)))
+    index = {}
+    for i, n in enumerate(names):
+        index.setdefault(n, i)
+    missing = [c for c in columns if c not in index]
+    if missing:
+        raise ValueError("Unknown columns {0} for {1}, columns are {2}".format(missing, schema.getName(), names))
+    return [index[c] for c in columns]
+
+
+def _predicate_columns(names, where):
+    """ Returns the names of the columns a where predicate may use: the names found in
+    an expression string, or all of them for a function."""
+    if not isinstance(where, str):
+        return list(names)
+    return [n for n in names if re.search(r"(?<![\w.])%s(?!\w)" % re.escape(n), where)]
+
+
+def _fetch_column(tupleset, i, ftype):
+    if ftype == OPL_INTEGER:
+        return tupleset.getIntColumnValues(i)
+    elif ftype == OPL_FLOAT:
+        return tupleset.getNumColumnValues(i)
+    else:
+        return tupleset.getSymbolColumnValues(i)
+
+
+def _output_column(values, ftype, categorical=False):
+    """ Converts a column fetched from a tuple set to a typed numpy array:
+    int64 for int columns, float64 for float columns, object for symbols.
+    If categorical is True, symbols are returned as a pandas Categorical where
+    each distinct symbol is stored once."""
+    if ftype == OPL_STRING and categorical:
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        return pd.Categorical.from_codes(codes, uniques)
+    dtype = _OUTPUT_DTYPES[ftype]
+    if isinstance(values, (list, tuple)):
+        return np.array(values, dtype=dtype)
+    return np.fromiter(values, dtype=dtype)
+
+
+_OUTPUT_DTYPES = {OPL_INTEGER: np.int64, OPL_FLOAT: np.float64, OPL_STRING: object}
+
+
+_TABLE_FILE_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+
+def _write_table_file(path, fmt, labels, arrays, chunk_rows):
+    """ Writes compact columns to a parquet, arrow or csv file by chunks and returns the number of rows."""
+    rows = 0
+    if fmt == "csv" and pa is None:
+        with open(path, "w") as f:
+            for i, df in enumerate(_iter_chunks(labels, arrays, chunk_rows, allow_empty=True)):
+                df.to_csv(f, header=(i == 0), index=False)
+                rows += len(df)
+        return rows
+    writer = None
+    try:
+        # symbols are written dictionary encoded, except in csv files
+        batches = _iter_chunks(labels, arrays, chunk_rows, fmt != "csv", True, allow_empty=True)
+        for batch in batches:
+            if writer is None:
+                if fmt == "parquet":
+                    import pyarrow.parquet as pq
+                    writer = pq.ParquetWriter(path, batch.schema)
+                elif fmt == "arrow":
+                    import pyarrow.ipc as ipc
+                    writer = ipc.new_file(path, batch.schema)
+                else:
+                    import pyarrow.csv as pcsv
+                    writer = pcsv.CSVWriter(path, batch.schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _parse_subscripts(level):
+    quoted = level.str.startswith('"') & level.str.endswith('"')
+    if quoted.all():
+        return level.str.slice(1, -1)
+    if not quoted.any():
+        try:
+            return pd.to_numeric(level)
+        except ValueError:
+            pass
+    return level
+
+
+def _parse_opl_names(names):
+    """ Parses OPL element names such as ct[1]["A"] into an index of their subscripts, (1, "A").
+    Integer and float subscripts are converted, quotes are removed from string subscripts.
+    Names of tuple subscripts (<1,"A">) are kept as they are. If the names do not all have the
+    same number of subscripts, they are returned unparsed."""
+    names = pd.Series(names, dtype=object)
+    if len(names) == 0:
+        return pd.Index(names)
+    subscripts = names.str.extract(r"^[^\[]*\[(.*)\]$", expand=False)
+    if subscripts.isnull().any():
+        return pd.Index(names)
+    levels = subscripts.str.split("][", expand=True, regex=False)
+    if levels.isnull().values.any():
+        return pd.Index(names)
+    levels = [_parse_subscripts(levels[c]).values for c in levels.columns]
+    if len(levels) == 1:
+        return pd.Index(levels[0])
+    return pd.MultiIndex.from_arrays(levels)
+
+
+class _BatchedRows(object):
+    """ Internal undocumented class: an iterable of rows to be read by batches."""
+    def __init__(self, rows, batch_size):
+        self.rows = rows
+        self.batch_size = batch_size
+
+
+class _FileInput(object):
+    """ Internal undocumented class: a parquet or csv file read at generation time."""
+    def __init__(self, path, fmt):
+        self.path = path
+        self.format = fmt
+
+    def _fingerprint(self):
+        # see doopl.cache._input_fingerprint
+        stat = os.stat(self.path)
+        return "file:%s:%d:%d" % (os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size)
+
+
+class _DeferredInput(object):
+    """ Internal undocumented class: a callable returning the input value, called at generation time."""
+    def __init__(self, factory, batch_size):
+        self.factory = factory
+        self.batch_size = batch_size
+
+
+class _PreparedInput(object):
+    """ Internal undocumented class: columns already converted at a previous generation."""
+    def __init__(self, names, fields, bycolumn):
+        self.names = names
+        self.fields = fields
+        self.bycolumn = bycolumn
+
+
+def _convert_input(name, value, names, fields, downcast=False):
+    """ Converts an input value to column buffers, or returns None for row iterables."""
+    if isinstance(value, _PreparedInput):
+        return value.bycolumn
+    elif isinstance(value, list):
+        return [list(i) for i in zip(*(col for col in value))]
+    elif isinstance(value, pd.DataFrame):
+        positions = _column_positions(name, names, fields, value.columns)
+        return _dataframe_columns(name, value, fields, positions, downcast)
+    elif _is_arrow(value):
+        table = _flatten_structs(_arrow_table(value))
+        positions = _column_positions(name, names, fields, table.column_names)
+        return _arrow_columns(name, table, fields, positions, downcast)
+    elif isinstance(value, _FileInput):
+        _check_column_count(name, names, fields, names)
+        try:
+            table = _read_file(value.path, value.format, names, fields)
+        except (KeyError, ValueError) as e:
+            message = 'Cannot read input name=%s from %s, expected columns = %s: %s' % (
+            name, value.path, names, e)
+            raise OplRuntimeException(message)
+        positions = list(range(0, len(fields)))
+        if isinstance(table, pd.DataFrame):
+            return _dataframe_columns(name, table, fields, positions, downcast)
+        return _arrow_columns(name, table, fields, positions, downcast)
+    elif isinstance(value, _BatchedRows):
+        return _stream_columns(name, value.rows, names, fields, value.batch_size, downcast)
+    return None
+
+
+def _is_reusable(value):
+    """ Returns True if an input can be read at several generations: row iterables
+    and record batch readers are consumed by the first one."""
+    if _is_arrow(value):
+        return not isinstance(value, pa.RecordBatchReader)
+    return isinstance(value, (list, pd.DataFrame, _FileInput, _DeferredInput, _PreparedInput))
+
+
+def _make_input(name, value, batch_size=None):
+    if isinstance(value, str):
+        fmt = _file_format(value)
+        if fmt is None:
+            message = "Unsupported file format for {0}: {1}, expecting .parquet|.pq|.csv\n".format(name, value)
+            raise OplRuntimeException(message)
+        return _FileInput(value, fmt)
+    if batch_size is not None and not isinstance(value, (list, pd.DataFrame)) and not _is_arrow(value):
+        return _BatchedRows(value, batch_size)
+    return value
+
+
 class MyDataSource(IloOplDataSourceWrapper):
     def __init__(self, opl, inputs):
         """ Internal undocumented class"""
@@ -63,84 +726,107 @@ class MyDataSource(IloOplDataSourceWrapper):
         self._opl = opl
         self._inputs = inputs
 
+    def _prepare(self, name, value, names, fields):
+        """ Converts an input to column buffers ready to be pushed to OPL, going
+        through input_cache when it is enabled.
+        Returns None for row iterables, which are committed row by row.
+        This only works on python data and can run in a worker thread."""
+        options = self._opl._input_options.get(name, {})
+        downcast = options.get("downcast", False)
+        deduplicate = options.get("deduplicate", False)
+        keys = options.get("keys", None)
+        key = None
+        if input_cache.max_bytes > 0:
+            fingerprint = _input_fingerprint(value)
+            if fingerprint is not None:
+                key = (fingerprint, tuple(names), tuple(fields), downcast, deduplicate, keys)
+                bycolumn = input_cache.get(key)
+                if bycolumn is not None:
+                    return bycolumn
+        bycolumn = _convert_input(name, value, names, fields, downcast)
+        if bycolumn is not None and (deduplicate or keys) and not isinstance(value, _PreparedInput):
+            bycolumn = _deduplicate(name, names, bycolumn, keys)
+        if key is not None and bycolumn is not None:
+            bycolumn = _cacheable_columns(bycolumn, fields)
+            input_cache.put(key, bycolumn)
+        return bycolumn
+
     # noinspection PyProtectedMember
     def read(self):
         dh = self.getDataHandler()
         env = self._opl.getEnv()
         getFields = self._opl._getFields
 
-        for (name, value) in iteritems(self._inputs):
-            tuple_set = dh._prepareSet(name)
-            schema = tuple_set.getSchema()
-
-            fields, fieldsSize = getFields(schema)
-
-            def addCell(cells, index, f, v):
-                if f == OPL_STRING:
-                    # noinspection PyUnresolvedReferences
-                    if isinstance(v, str):
-                        cells.setStringValue(index, v)
-                    elif type(v) in {int, float}:
-                        cells.setStringValue(index, str(v))
-                    elif PY2 and isinstance(v, unicode):
-                        cells.setStringValue(index, str(v).encode("utf-8"))
-                    else:
-                        cells.setStringValue(index, str(v))
-                else:
-                    cells.setNumValue(index, float(v))
-
-            # noinspection PyUnresolvedReferences
-            def fill_tuple_set(tupleset, values):
-                size = len(bycolumn[0])
-                for c, ctype in enumerate(fields):
-                    col = bycolumn[c]
-                    if ctype == OPL_INTEGER:
-                        tupleset.setIntColumnValues(c, col, size)
-                    elif ctype == OPL_FLOAT:
-                        tupleset.setNumColumnValues(c, col, size)
-                    else:
-                        values = []
-                        for v in bycolumn[c]:
-                            if isinstance(v, str):
-                                values.append(v)
-                            elif type(v) in {int, float}:
-                                values.append(str(v))
-
-                            elif PY2 and isinstance(v, unicode):
-                                values.append(str(v).encode("utf-8"))
-                            else:
-                                values.append(str(v))
-                        tupleset.setStringColumnValues(c, values, size)
-                        values = None
-                tupleset.fillTupleHash()
-
-            if isinstance(value, list):
-                bycolumn = [list(i) for i in zip(*(col for col in value))]
-                fill_tuple_set(tuple_set, bycolumn)
-                bycolumn = None
-            else:
-                if isinstance(value, pd.DataFrame):
-                    bycolumn = [value[n].tolist() for n in value.columns]
-                    # if schema.getSize() != len(bycolumn):
-                    if len(fields) != len(bycolumn):
-                        tuple_names = [schema.getColumnName(i) for i in range(0, schema.getSize())]
-                        message = 'Column mistmatch, input name=%s, expected = %s, data = %s' % (
-                        name, tuple_names, [n for n in value.columns])
-                        raise OplRuntimeException(message)
-                    fill_tuple_set(tuple_set, bycolumn)
-                    bycolumn = None
-                else:
-                    hasKey = schema.hasKey()
-                    commitMethod = tuple_set.commit if hasKey else tuple_set.commit2HashTable
-                    cells = IloTupleCellArray(env, fieldsSize)
-                    for v in value:
-                        for (i, t) in enumerate(v):
-                            addCell(cells, i, fields[i], t)
-                        commitMethod(cells, False)
-
-                    if hasKey is False:
-                        tuple_set.fillColumns()
-                    cells.end()
+        workers = self._opl._input_workers
+        executor = ThreadPoolExecutor(max_workers=workers) if workers is not None else None
+        try:
+            for (name, value) in iteritems(self._inputs):
+                # each set is prepared right before being filled, as the data handler expects:
+                # the schema, and so the conversion, are only known once the set is prepared
+                tuple_set = dh._prepareSet(name)
+                schema = tuple_set.getSchema()
+                fields, _ = getFields(schema)
+                names = _flat_field_names(schema)
+                self._push(name, value, tuple_set, schema, names, fields, env, executor)
+                # the data now lives in OPL, drop the python side as soon as possible
+                value = None
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _push(self, name, value, tuple_set, schema, names, fields, env, executor=None):
+        if isinstance(value, _DeferredInput):
+            data = value.factory()
+            if data is None:
+                raise OplRuntimeException("Deferred input {0} returned None".format(name))
+            value = _make_input(name, data, value.batch_size)
+            data = None
+        bycolumn = self._prepare(name, value, names, fields)
+        if bycolumn is not None:
+            _fill_tuple_set(tuple_set, fields, bycolumn, executor)
+        else:
+            hasKey = schema.hasKey()
+            commitMethod = tuple_set.commit if hasKey else tuple_set.commit2HashTable
+            cells = IloTupleCellArray(env, len(fields))
+            write = _row_writer(cells, fields)
+            for v in value:
+                write(v)
+                commitMethod(cells, False)
+            write = None
+
+            if hasKey is False:
+                tuple_set.fillColumns()
+            cells.end()
+        if bycolumn is not None and self._opl._input_options.get(name, {}).get("track_changes", False):
+            # kept to apply later changes, see OplModel.update_input
+            self._opl._loaded_inputs[name] = _PreparedInput(names, fields, _cacheable_columns(bycolumn, fields))
+
+
+class _Report(Mapping):
+    """ Internal undocumented class: the post processing tables of an OplModel,
+    converted to dataframes on first access."""
+    def __init__(self, model, names):
+        self._model = model
+        self._names = names
+        self._tables = {}
+
+    def __getitem__(self, name):
+        table = self._tables.get(name, None)
+        if table is None:
+            if name not in self._names:
+                raise KeyError(name)
+            table = self._model.get_table(name)
+            self._tables[name] = table
+        return table
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
 
 
 class OplModel(object):
@@ -149,15 +835,23 @@ class OplModel(object):
     python tuple lists or python dataframes.
     """
 
-    def __init__(self, env, opl, filename=None):
+    def __init__(self, env, opl, filename=None, model_source=None):
         self._env = env
         self._opl = opl
+        self._model_source = model_source
         self._inputs = OrderedDict()
+        self._input_options = {}
+        self._data_elements = OrderedDict()
+        self._loaded_inputs = {}
+        self._input_changes = OrderedDict()
         self._datfiles = []
         self._cplex_quality = None
         self._cplex_stats = None
         self._filename = filename
         self._fieldDict = {}
+        self._input_workers = None
+        self._report = None
+        self._report_table_names = None
 
     def getEnv(self):
         return self._env
@@ -181,6 +875,8 @@ class OplModel(object):
         opls += "     {0:d} python structures\n".format(len(self._inputs))
         for k, v in iteritems(self._inputs):
             opls += ("         {0} custom input (pandas, sql, tuple lists)\n".format(k))
+        for k in self._data_elements:
+            opls += ("         {0} custom input (scalar, set, array)\n".format(k))
         return opls
 
     def __enter__(self):
@@ -191,18 +887,50 @@ class OplModel(object):
 
     def end(self):
         self._inputs = None
+        self._input_options = None
+        self._data_elements = None
+        self._loaded_inputs = None
+        self._input_changes = None
+        self._model_source = None
         self._datfiles = None
         self._cplex_stats = None
         self._cplex_quality = None
         self._fieldDict = None
+        self._report = None
+        self._report_table_names = None
         self._env.end()
         # ensure empty
         self._env = None
 
-    def set_input(self, name, value=None):
+    def set_input(self, name, value=None, batch_size=None, downcast=False, deduplicate=False, keys=None,
+                  track_changes=False):
         """  Add an input IloTupleSet to OPL problem
         :param name: name of the input IloTupleSet to initialize or a .dat filename
-        :param value: a list of tuples, a pandas dataframe, an iterable of iterable or None if a .dat filename is used
+        For external data that are not tuple sets, value can be a scalar, a python set, a range,
+        a numpy array or (nested) list for an array, or a pandas series or dict for an array indexed by
+        the keys of the series. Python sets are passed to OPL in sorted order.
+        :param value: a list of tuples, a pandas dataframe, a pyarrow Table, RecordBatch or RecordBatchReader,
+            the path of a .parquet or .csv file, an iterable of iterable or None if a .dat filename is used.
+            Only the columns named after the tuple fields are read from a file, in the tuple order.
+            value can also be a callable without arguments (e.g. a generator function) returning one of
+            the above: it is called only when OPL reads this tuple set at generation time, and its result
+            is released as soon as it has been pushed to OPL.
+        :param batch_size: if set, an iterable of iterable (e.g. an sql alchemy result) is read by batches
+            of batch_size rows (with fetchmany when available) and pushed column by column,
+            instead of being committed row by row.
+            For tuples with sub tuples, dataframe, arrow and file columns are matched by their dotted name
+            (e.g. 'origin.id' for the field id of the sub tuple column origin); arrow struct columns are
+            flattened the same way.
+        :param downcast: if True, float values given for int fields of a dataframe, arrow, file or
+            batched input are truncated. Otherwise such values must be integral, or an OplRuntimeException
+            is raised before the data of this input is pushed to OPL. In both cases, values out of the 64 bits integer range
+            are rejected.
+        :param deduplicate: if True, duplicate rows are dropped before being pushed to OPL.
+        :param keys: the names of the key fields of the tuple. If set, duplicate rows are dropped and
+            an OplRuntimeException reporting the conflicting keys is raised when distinct rows share the same key.
+            deduplicate and keys apply to every input but row iterables read without batch_size.
+        :param track_changes: if True, the converted data is kept after generation so that
+            update_input can later apply changes to it.
 
         """
         if value is not None:
@@ -215,10 +943,21 @@ class OplModel(object):
                 message = "{0} is not an external ... data\n".format(name)
                 raise OplRuntimeException(message)
             if definition.isTupleSet() is False:
-                message = "Only TupleSets are supported via doopl: {0} is not an external TupleSet.\n".format(name)
-                raise OplRuntimeException(message)
-
+                # scalars, sets of primitives, ranges and arrays
+                self._data_elements[name] = value
+                return
+
+            if batch_size is not None and batch_size <= 0:
+                raise ValueError("batch_size must be positive, {0!r} was passed".format(batch_size))
+            if callable(value):
+                value = _DeferredInput(value, batch_size)
+            else:
+                value = _make_input(name, value, batch_size)
             self._inputs[name] = value
+            self._input_options[name] = {"downcast": downcast,
+                                         "deduplicate": deduplicate,
+                                         "keys": tuple(keys) if keys else None,
+                                         "track_changes": track_changes}
         else:
             self._datfiles.append(name)
 
@@ -281,8 +1020,88 @@ class OplModel(object):
         _profiler.setIgnoreUserSection(True)
         settings.setProfiler(_profiler)
 
+    def use_parallel_inputs(self, max_workers=None):
+        """
+        Use this method to convert the string columns of each input to OPL symbols in a pool
+        of threads before they are pushed to OPL. Inputs are still read one after the other:
+        the data handler only gives the schema of a tuple set when it is about to be filled.
+        :param max_workers: the number of threads, defaults to the number of processors
+        :return:
+        """
+        if max_workers is not None and max_workers <= 0:
+            raise ValueError("max_workers must be positive, {0!r} was passed".format(max_workers))
+        self._input_workers = max_workers or os.cpu_count() or 1
+
+    def update_input(self, name, inserted=None, deleted=None, updated=None):
+        """
+        Records changes to an input tuple set set with track_changes=True, relative to the data
+        of the last generation. At the next generate() or run(), the changes are applied to the
+        data converted at the previous generation, and the problem is generated again in a new
+        OPL model instance: only the changed rows are converted.
+        Settings applied to the previous instance (mute, .ops files, profiler...) must be applied again.
+        Updated rows are removed and appended at the end of the tuple set, like inserted rows,
+        so the order of the tuples changes.
+        Inputs set with track_changes=True are pushed again from their converted data. The other
+        inputs are read again at the next generation, so they cannot be row iterables or
+        RecordBatchReaders, which are consumed by the first generation.
+        The previous OPL model instance cannot be released (the OPL bindings have no IloOplModel.end()):
+        it is kept in memory until this OplModel is ended. In a long replanning loop, create a new
+        OplModel every few cycles to bound the memory used.
+        :param name: name of the input IloTupleSet
+        :param inserted: rows to add, as any value accepted by set_input
+        :param deleted: rows to remove (all their fields must match)
+        :param updated: rows replacing the rows with the same key; requires the keys argument of set_input
+        :return:
+        """
+        loaded = self._loaded_inputs.get(name, None)
+        if loaded is None:
+            message = "{0} must be set with track_changes=True and generated before being updated\n".format(name)
+            raise OplRuntimeException(message)
+        if self._model_source is None:
+            raise OplRuntimeException("The OPL model source is not available, the model cannot be generated again")
+        consumed = [n for n, v in iteritems(self._inputs) if n not in self._loaded_inputs and not _is_reusable(v)]
+        if consumed:
+            message = "Inputs {0} were consumed by the previous generation, set them again as lists, " \
+                      "dataframes or callables before updating {1}\n".format(consumed, name)
+            raise OplRuntimeException(message)
+        options = self._input_options[name]
+        if updated is not None and not options["keys"]:
+            raise OplRuntimeException("{0} must be set with keys to be updated\n".format(name))
+        changes = self._input_changes.setdefault(name, [])
+        for kind, value in (("deleted", deleted), ("updated", updated), ("inserted", inserted)):
+            if value is None:
+                continue
+            value = _make_input(name, value)
+            delta = _convert_input(name, value, loaded.names, loaded.fields, options["downcast"])
+            if delta is None:
+                delta = _convert_input(name, list(value), loaded.names, loaded.fields)
+            changes.append((kind, _cacheable_columns(delta, loaded.fields)))
+
+    def _apply_input_changes(self):
+        # every tracked input is pushed again from its converted columns, changed or not:
+        # its source (a row iterable, a record batch reader...) may have been consumed
+        for name, loaded in iteritems(self._loaded_inputs):
+            bycolumn = loaded.bycolumn
+            changes = self._input_changes.get(name, None)
+            if changes:
+                keys = self._input_options[name]["keys"]
+                key_positions = [loaded.names.index(k) for k in keys] if keys else None
+                bycolumn = _apply_changes(bycolumn, loaded.fields, changes, key_positions)
+            self._inputs[name] = _PreparedInput(loaded.names, loaded.fields, bycolumn)
+        self._input_changes.clear()
+        self._loaded_inputs.clear()
+        self._opl = self._env._createOplModel(self._model_source)
+        self._cplex_quality = None
+        self._cplex_stats = None
+        self._fieldDict = {}
+
     def __generate(self):
+        # post processing tables change with the next generation or solve
+        self._report = None
+        self._report_table_names = None
         try:
+            if len(self._input_changes) != 0:
+                self._apply_input_changes()
             if self._opl.isGenerated() is False:
                 self._opl.getSettings().setSkipWarnNeverUsedElements(True)
                 self._opl.getSettings().setWithNames(True)
@@ -294,10 +1113,19 @@ class OplModel(object):
                     for v in self._datfiles:
                         d = IloOplDataSource(self._opl.getEnv(), v)
                         self._opl.addDataSource(d)
-                if self._opl.hasMain():
-                    self._opl.main()
-                else:
-                    self._opl.generate()
+                datfile = None
+                if len(self._data_elements) != 0:
+                    datfile = _write_dat(self._data_elements)
+                    d = IloOplDataSource(self._opl.getEnv(), datfile)
+                    self._opl.addDataSource(d)
+                try:
+                    if self._opl.hasMain():
+                        self._opl.main()
+                    else:
+                        self._opl.generate()
+                finally:
+                    if datfile is not None:
+                        os.remove(datfile)
             return True
 
         except Exception:
@@ -449,58 +1277,131 @@ class OplModel(object):
         self._cplex_stats = ret
         return ret
 
-    def get_table(self, name, as_pandas=True):
+    def get_table(self, name, as_pandas=True, columns=None, where=None, categorical=False):
         """
         Retrieves an IloTupleSet as a pandas dataframe
+        The fields of sub tuples are named after the column holding them (e.g. 'origin.id'),
+        as set_input expects them.
         :param name: name of the IloTupleSet
         :param as_pandas: if True, returns the tupleset as a pandas dataframe, else
             returns a list.
+        :param columns: if set, the names of the columns to retrieve, in this order.
+            Only these columns are fetched from OPL.
+        :param where: if set, a filter on the rows: either a pandas expression string (e.g. "qty > 0")
+            or a function taking the dataframe and returning a boolean mask. The columns used by
+            an expression are fetched even if they are not in columns (a function gets all the
+            columns), and dropped after filtering.
+        :param categorical: if True, symbol columns are returned as pandas categoricals:
+            each distinct symbol is stored once (symbols are still decoded row by row).
 
         :return: a pandas dataframe, or a list.
         """
         if self._is_tuple_set(name):
             elt = self._opl.getElement(name)
-            return self._convert_tupleset(elt.asTupleSet(), as_pandas)
+            return self._convert_tupleset(elt.asTupleSet(), as_pandas, columns, where, categorical)
         else:
             raise ValueError("Expecting tupleset, {0!r} was passed".format(name))
 
-    def _convert_tupleset(self, tupleset, as_pandas=True):
+    def _convert_tupleset(self, tupleset, as_pandas=True, columns=None, where=None, categorical=False):
         schema = tupleset.getSchema()
         fields, size = self._getFields(schema)  # ._getColumnTypes()#_get_schema_types(schema)
-
-        columns = []
-        for i, ftype in enumerate(fields):
-            if ftype == OPL_INTEGER:
-                columns.append(tupleset.getIntColumnValues(i))
-            elif ftype == OPL_FLOAT:
-                columns.append(tupleset.getNumColumnValues(i))
-            else:
-                columns.append(tupleset.getSymbolColumnValues(i))
-
-        rep = [tuple(i) for i in zip(*(c for c in columns))]
-
-        def get_names(schem):
-            names = list()
-            if schem._hasSubTuple() is False:
-                for i in range(0, schem.getSize()):
-                    names.append(schem.getColumnName(i))
-            else:
-                for i in range(0, schem.getSize()):
-                    if schem._isTuple(i):
-                        sub = schema._getTupleColumn(i)
-                        subNames = get_names(sub)
-                        subName = sub.getName()
-                        for sn in subNames:
-                            names.append(subName + "." + sn)
-                    else:
-                        names.append(schem.getColumnName(i))
-            return names
-
+        names = _flat_field_names(schema)
+        fetched = columns
+        if columns is not None and where is not None:
+            # the columns the predicate needs are fetched too, and dropped after filtering
+            fetched = list(columns) + [n for n in _predicate_columns(names, where) if n not in columns]
+        selected = _select_columns(schema, names, fields, fetched)
+        values = [_fetch_column(tupleset, i, fields[i]) for i in selected]
+
+        if not as_pandas and where is None:
+            return [tuple(i) for i in zip(*(c for c in values))]
+
+        arrays = OrderedDict()
+        for k, i in enumerate(selected):
+            arrays[k] = _output_column(values[k], fields[i], categorical)
+            values[k] = None
+        df = pd.DataFrame(arrays, copy=False)
+        df.columns = [names[i] for i in selected]
+        if where is not None:
+            mask = df.eval(where) if isinstance(where, str) else where(df)
+            df = df[np.asarray(mask, dtype=bool)].reset_index(drop=True)
+            if fetched is not columns:
+                df = df.iloc[:, list(range(0, len(columns)))]
         if as_pandas:
-            names = get_names(schema)
-            return pd.DataFrame(rep, columns=names)
-        else:
-            return rep
+            return df
+        return list(df.itertuples(index=False, name=None))
+
+    def iter_table(self, name, chunk_rows=100000, columns=None, categorical=False, as_arrow=False):
+        """
+        Iterates over an IloTupleSet by chunks of rows.
+        Each column is fetched once and kept in a compact form (typed numpy arrays, symbol codes),
+        the row tuples and the whole dataframe are never built.
+        :param name: name of the IloTupleSet
+        :param chunk_rows: the maximum number of rows of each chunk
+        :param columns: if set, the names of the columns to retrieve, in this order
+        :param categorical: if True, symbol columns are returned as categoricals (dictionary arrays with as_arrow)
+        :param as_arrow: if True, yields pyarrow RecordBatches instead of pandas dataframes
+        :return: an iterator of pandas dataframes, or of pyarrow RecordBatches
+        """
+        if chunk_rows <= 0:
+            raise ValueError("chunk_rows must be positive, {0!r} was passed".format(chunk_rows))
+        if as_arrow and pa is None:
+            raise OplRuntimeException("pyarrow is required to iterate over tables as arrow record batches")
+        labels, arrays = self._fetch_compact_columns(name, columns)
+        return _iter_chunks(labels, arrays, chunk_rows, categorical, as_arrow)
+
+    def _fetch_compact_columns(self, name, columns=None):
+        """ Fetches the columns of an IloTupleSet as typed numpy arrays, and symbols as categoricals"""
+        if not self._is_tuple_set(name):
+            raise ValueError("Expecting tupleset, {0!r} was passed".format(name))
+        tupleset = self._opl.getElement(name).asTupleSet()
+        schema = tupleset.getSchema()
+        fields, _ = self._getFields(schema)
+        names = _flat_field_names(schema)
+        selected = _select_columns(schema, names, fields, columns)
+        labels = [names[i] for i in selected]
+        arrays = [_output_column(_fetch_column(tupleset, i, fields[i]), fields[i], True) for i in selected]
+        return labels, arrays
+
+    def write_tables(self, directory, format="parquet", names=None, chunk_rows=100000, max_workers=None):
+        """
+        Writes post processing tables to files, one file per table, without building dataframes.
+        Tables are fetched from OPL one after the other, and encoded and written in parallel
+        by chunks of rows. A manifest.json file listing the files, row counts and sizes is written
+        in the directory as well.
+        :param directory: the output directory, created if needed
+        :param format: parquet, arrow (Arrow IPC file) or csv. parquet and arrow require pyarrow.
+        :param names: the names of the tables to write, defaults to output_table_names
+        :param chunk_rows: the number of rows written at once
+        :param max_workers: the number of writer threads, defaults to the number of processors
+        :return: the manifest, a dict { name => {"path": ..., "rows": ..., "bytes": ...} }
+        """
+        if format not in _TABLE_FILE_EXTENSIONS:
+            raise ValueError("Invalid table format: {0}, expecting parquet|arrow|csv".format(format))
+        if format != "csv" and pa is None:
+            raise OplRuntimeException("pyarrow is required to write {0} files".format(format))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if names is None:
+            names = self._get_report_table_names()
+        manifest = OrderedDict()
+        workers = max_workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = OrderedDict()
+            for name in names:
+                labels, arrays = self._fetch_compact_columns(name)
+                path = os.path.join(directory, name + _TABLE_FILE_EXTENSIONS[format])
+                pending[name] = (path, executor.submit(_write_table_file, path, format, labels, arrays, chunk_rows))
+                labels = arrays = None
+                # bounds the number of fetched tables waiting to be written
+                while len(pending) >= workers:
+                    done, (p, future) = pending.popitem(last=False)
+                    manifest[done] = {"path": p, "rows": future.result(), "bytes": os.path.getsize(p)}
+            for done, (p, future) in iteritems(pending):
+                manifest[done] = {"path": p, "rows": future.result(), "bytes": os.path.getsize(p)}
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump({"format": format, "tables": manifest}, f, indent=2)
+        return manifest
 
     def export_model(self, name):
         """
@@ -551,21 +1452,20 @@ class OplModel(object):
     @property
     def report(self):
         """
-        Returns all the IloTupleSet from post processing section as a dict {name : pandas dataframe}
-        :return: a dict { name => value }
+        Returns all the IloTupleSet from post processing section as a read only mapping {name : pandas dataframe}.
+        A table is converted when it is first accessed, and kept until the next generate() or run().
+        :return: a mapping { name => value }
         """
         return self._get_report()
 
     def _get_report(self):
         """
-        Returns all the IloTupleSet from post processing section as a dict {name : pandas dataframe}
-        :return: a dict
+        Returns all the IloTupleSet from post processing section as a lazy mapping {name : pandas dataframe}
+        :return: a mapping
         """
-        rep = dict()
-        names = self._get_report_table_names()
-        for n in names:
-            rep[n] = self.get_table(n)
-        return rep
+        if self._report is None:
+            self._report = _Report(self, self._get_report_table_names())
+        return self._report
 
     def compile(self, name):
         self.__generate()
@@ -590,14 +1490,16 @@ class OplModel(object):
         Returns all the IloTupleSet names from post processing section as a list of strings
         :return: a list
         """
-        rep = []
-        names = self._opl.getElementNamesInPostProcessing()
-        for i in range(0, names.getSize()):
-            name = names.get_String(i)
-            elt = self._opl.getElement(name)
-            if self._is_tuple_set(name):
-                rep.append(elt.getName())
-        return rep
+        if self._report_table_names is None:
+            rep = []
+            names = self._opl.getElementNamesInPostProcessing()
+            for i in range(0, names.getSize()):
+                name = names.get_String(i)
+                elt = self._opl.getElement(name)
+                if self._is_tuple_set(name):
+                    rep.append(elt.getName())
+            self._report_table_names = rep
+        return list(self._report_table_names)
 
     def _is_tuple_set(self, name):
         try:
@@ -613,74 +1515,137 @@ class OplModel(object):
         elt = self._opl.getElement(name)
         return elt.isDecisionExpression()
 
+    def to_sql(self, con, name, table=None, batch_size=10000, clear=True, bulk=False):
+        """
+        Publishes a post processing table in a database table.
+        The database table must exist with the columns of the tuple set, in the same order.
+        All the rows are written in a single transaction, by batches.
+        :param con: a DBAPI connection, a SqlAlchemy engine or a SqlAlchemy connection
+        :param name: the name of the IloTupleSet to publish
+        :param table: the name of the database table, defaults to name
+        :param batch_size: the number of rows sent at once
+        :param clear: if True, the database table is cleared before the rows are published
+        :param bulk: if True, uses COPY with psycopg2, and turns synchronous writes off with SQLite.
+            The latter gives up durability: a power failure may lose or corrupt the published rows.
+        :return: the number of rows written
+        """
+        labels, arrays = self._fetch_compact_columns(name)
+        return _publish_columns(con, table or name, labels, arrays, batch_size, clear, bulk)
+
+    def publish_tables(self, con, names=None, max_workers=4, batch_size=10000, clear=True, bulk=False):
+        """
+        Publishes several post processing tables in database tables with the same names, in parallel.
+        Tables are fetched from OPL one after the other, and each one is written in its own
+        transaction, on its own connection.
+        :param con: a SqlAlchemy engine (connections are taken from its pool), a function returning
+            a new DBAPI connection, or a single DBAPI or SqlAlchemy connection (tables are then written
+            one after the other)
+        :param names: the names of the tables to publish, defaults to output_table_names
+        :param max_workers: the number of tables written at the same time
+        :param batch_size: see to_sql
+        :param clear: see to_sql
+        :param bulk: see to_sql
+        :return: a dict { name => number of rows written }
+        """
+        if names is None:
+            names = self._get_report_table_names()
+        ret = OrderedDict()
+        if _is_single_connection(con):
+            # a single connection is used from the calling thread only
+            for name in names:
+                ret[name] = self.to_sql(con, name, None, batch_size, clear, bulk)
+            return ret
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = OrderedDict()
+            for name in names:
+                labels, arrays = self._fetch_compact_columns(name)
+                pending[name] = executor.submit(_publish_job, con, name, labels, arrays, batch_size, clear, bulk)
+                labels = arrays = None
+                while len(pending) >= max_workers:
+                    done, future = pending.popitem(last=False)
+                    ret[done] = future.result()
+            for done, future in iteritems(pending):
+                ret[done] = future.result()
+        return ret
+
+    def publish_delta(self, con, name, keys, state, table=None, batch_size=10000, bulk=False):
+        """
+        Publishes a post processing table incrementally: only the rows inserted, changed or deleted
+        since the last publication recorded in state are written to the database table.
+        Changed rows are deleted and inserted again, all in a single transaction, so this works
+        with any database. Rows are deleted one key at a time (DELETE ... WHERE key = ?): on large
+        tables, the database table needs an index on the key columns. The first publication of a
+        table (not in state yet, or with other columns or keys) clears the database table and
+        writes all the rows.
+        :param con: a DBAPI connection, a SqlAlchemy engine or a SqlAlchemy connection
+        :param name: the name of the IloTupleSet to publish
+        :param keys: the names of the columns identifying a row
+        :param state: a dict kept by the caller between publications, updated by this method.
+            For each table it holds the key columns and 64 bits hashes of the keys and rows.
+        :param table: the name of the database table, defaults to name
+        :param batch_size: see to_sql
+        :param bulk: see to_sql
+        :return: a dict {"inserted": ..., "updated": ..., "deleted": ...} of row counts
+        """
+        labels, arrays = self._fetch_compact_columns(name)
+        return _publish_delta(con, table or name, labels, arrays, keys, state, batch_size, bulk)
+
     def _to_sql(self, con, name):
         """
-        Unsupported method to publish table in a database.
+        Publishes a table in a database: see to_sql.
         The table must exist in the database, and will be cleared before the results are published.
         :param con: a SqlAlchemy connection
         :param name: the table to publish
         :return:
         """
-        table = self.get_table(name, as_pandas=False)
-        if con.has_table(name) is False:
-            raise ValueError("Table {0} does not exist".format(name))
-        else:
-            query = "DELETE FROM {0:s}".format(name)
-            con.execute(query)
+        self.to_sql(con, name)
 
-        if len(table):
-            size = len(table[0])
-            wildcards = ','.join(['?'] * size)
-            query = 'INSERT INTO {0:s} VALUES ({1:s})'.format(name, wildcards)
-            con.execute(query, table)
-            wildcards = None
-        table = None
+    def _get_sensitivity(self, name, getter, as_pandas, index):
+        names = self._opl._getNames(name)
+        array = getter(name)
+        try:
+            # one getter call per element, the wrappers have no bulk accessor
+            labels = names.to_numpy()
+            values = array.to_numpy()
+        finally:
+            names.end()
+            array.end()
+        if not as_pandas:
+            return dict(zip(labels.tolist(), values.tolist()))
+        return pd.Series(values, index=_parse_opl_names(labels) if index else pd.Index(labels), name=name)
 
-    def get_slacks(self, name):
+    def get_slacks(self, name, as_pandas=False, index=True):
         """
         Returns the slacks for a map of constraints.
         Works only if the "names" setting is kept on as in default.
+        The names and values are still read one element at a time through the OPL wrappers
+        (see IloNumArray.to_numpy), only the parsing of the names is vectorized.
         :param name: name of a Map element
-        :return: a dict (name of element => value)
+        :param as_pandas: return a pandas Series instead of a dict
+        :param index: with as_pandas, index the Series by the parsed subscripts of the names,
+            for example ct[1]["A"] gives (1, "A"). Otherwise it is indexed by the names.
+        :return: a dict (name of element => value), or a pandas Series
         """
-        names = self._opl._getNames(name)
-        slacks = self._opl._getSlacks(name)
-        ret = {}
-        for i in range(0, slacks.getSize()):
-            ret[names.get_String(i)] = slacks.get_Num(i)
-        names.end()
-        slacks.end()
-        return ret
+        return self._get_sensitivity(name, self._opl._getSlacks, as_pandas, index)
 
-    def get_reduced_costs(self, name):
+    def get_reduced_costs(self, name, as_pandas=False, index=True):
         """
-        Returns the slacks for a map of variables.
+        Returns the reduced costs for a map of variables.
         Works only if the "names" setting is kept on as in default.
         :param name: name of a Map element
-        :return: a dict (name of element => value)
+        :param as_pandas: see get_slacks
+        :param index: see get_slacks
+        :return: a dict (name of element => value), or a pandas Series
         """
-        names = self._opl._getNames(name)
-        costs = self._opl._getReducedCosts(name)
-        ret = {}
-        for i in range(0, costs.getSize()):
-            ret[names.get_String(i)] = costs.get_Num(i)
-        names.end()
-        costs.end()
-        return ret
+        return self._get_sensitivity(name, self._opl._getReducedCosts, as_pandas, index)
 
-    def get_duals(self, name):
+    def get_duals(self, name, as_pandas=False, index=True):
         """
-        Returns the duals for a map of variables.
+        Returns the duals for a map of constraints.
         Works only if the "names" setting is kept on as in default.
-        :param name: nme of a Map element
-        :return: a dict (name of element => value)
+        :param name: name of a Map element
+        :param as_pandas: see get_slacks
+        :param index: see get_slacks
+        :return: a dict (name of element => value), or a pandas Series
         """
-        names = self._opl._getNames(name)
-        duals = self._opl._getDuals(name)
-        ret = {}
-        for i in range(0, duals.getSize()):
-            print(names.get_String(i))
-            ret[names.get_String(i)] = duals.get_Num(i)
-        names.end()
-        duals.end()
-        return ret
+        return self._get_sensitivity(name, self._opl._getDuals, as_pandas, index)
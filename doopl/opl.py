@@ -17,6 +17,30 @@ except:
             traceback.print_exc()
             raise ImportError('Could not import OPL wrappers. Make sure than OPL bin directory is in the PATH')
 
+import numpy as _np
+
+
+def _array_to_numpy(getter, dtype):
+    def to_numpy(self):
+        """ Returns the content of the array as a numpy array.
+        The wrappers have no bulk accessor: this still makes one python level call of the
+        element getter per element, it only saves the intermediate python containers.
+        The result is a copy: it stays valid after the array or its env is ended."""
+        size = self.getSize()
+        values = map(getattr(self, getter), range(size))
+        if dtype is object:
+            # np.fromiter only supports object arrays from numpy 1.23
+            return _np.array(list(values), dtype=object)
+        return _np.fromiter(values, dtype=dtype, count=size)
+    return to_numpy
+
+
+IloIntArray.to_numpy = _array_to_numpy("get_Int", _np.int64)
+IloNumArray.to_numpy = _array_to_numpy("get_Num", _np.float64)
+IloStringArray.to_numpy = _array_to_numpy("get_String", object)
+IloAnyArray.to_numpy = _array_to_numpy("get_String", object)
+
+
 class OplRuntimeException(Exception):
     '''The exception thrown by doopl methods when an error occurs
     '''
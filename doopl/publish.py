@@ -0,0 +1,187 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+# gendoc: ignore
+"""
+Writing of compact columns to databases, through DBAPI connections or SqlAlchemy.
+This does not need the OPL libraries.
+"""
+
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+from doopl.columns import _iter_chunks, _columns_frame, _take_rows
+
+
+def _iter_row_chunks(arrays, chunk_rows):
+    """ Yields lists of row tuples (of python values) of at most chunk_rows rows,
+    sliced from compact columns."""
+    size = len(arrays[0]) if arrays else 0
+    for start in range(0, size, chunk_rows):
+        stop = min(start + chunk_rows, size)
+        columns = []
+        for a in arrays:
+            part = a[start:stop]
+            if isinstance(part, pd.Categorical):
+                part = np.asarray(part, dtype=object)
+            columns.append(part.tolist())
+        yield list(zip(*columns))
+
+
+def _placeholder_list(paramstyle, size):
+    if paramstyle == "qmark":
+        return ["?"] * size
+    if paramstyle in ("format", "pyformat"):
+        return ["%s"] * size
+    # numeric, and named drivers which also accept positional :1 parameters
+    return [":%d" % (i + 1) for i in range(0, size)]
+
+
+def _placeholders(paramstyle, size):
+    return ",".join(_placeholder_list(paramstyle, size))
+
+
+def _dbapi_connection(con):
+    """ Returns the DBAPI connection, parameter style, driver name and release function for a
+    DBAPI connection, a SqlAlchemy engine (a connection is taken from its pool) or a SqlAlchemy
+    connection."""
+    if hasattr(con, "raw_connection"):
+        raw = con.raw_connection()
+        return raw, con.dialect.paramstyle, con.dialect.driver, raw.close
+    if hasattr(con, "dialect") and hasattr(con, "connection"):
+        return con.connection, con.dialect.paramstyle, con.dialect.driver, None
+    module = sys.modules.get(type(con).__module__.split(".")[0], None)
+    return con, getattr(module, "paramstyle", "qmark"), getattr(module, "__name__", ""), None
+
+
+def _is_single_connection(con):
+    """ Returns True for a DBAPI or SqlAlchemy connection, which must not be shared between threads,
+    False for a SqlAlchemy engine or a connection factory."""
+    if hasattr(con, "raw_connection"):
+        return False
+    return hasattr(con, "cursor") or (hasattr(con, "dialect") and hasattr(con, "connection"))
+
+
+def _publish_columns(con, table, labels, arrays, batch_size=10000, clear=True, bulk=False, deleted=None):
+    """ Writes compact columns into an existing database table, in a single transaction.
+    Rows are sent by batches with executemany, or with COPY for psycopg2 when bulk is True.
+    With SQLite and bulk, synchronous writes are turned off during the transaction.
+    If deleted is set to (key labels, key columns), the rows with these keys are deleted
+    first (instead of clearing the table).
+    Returns the number of rows written."""
+    raw, paramstyle, driver, release = _dbapi_connection(con)
+    try:
+        cursor = raw.cursor()
+        synchronous = None
+        if bulk and driver in ("sqlite3", "pysqlite"):
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous = OFF")
+        try:
+            if deleted is not None:
+                key_labels, key_arrays = deleted
+                where = " AND ".join("%s = %s" % kv for kv in zip(key_labels, _placeholder_list(paramstyle, len(key_labels))))
+                query = "DELETE FROM {0:s} WHERE {1:s}".format(table, where)
+                for chunk in _iter_row_chunks(key_arrays, batch_size):
+                    cursor.executemany(query, chunk)
+            elif clear:
+                cursor.execute("DELETE FROM {0:s}".format(table))
+            rows = 0
+            if bulk and driver == "psycopg2" and hasattr(cursor, "copy_expert"):
+                query = "COPY {0:s} FROM STDIN WITH (FORMAT csv)".format(table)
+                for df in _iter_chunks(labels, arrays, batch_size):
+                    buf = io.StringIO()
+                    df.to_csv(buf, header=False, index=False)
+                    buf.seek(0)
+                    cursor.copy_expert(query, buf)
+                    rows += len(df)
+            else:
+                query = "INSERT INTO {0:s} VALUES ({1:s})".format(table, _placeholders(paramstyle, len(labels)))
+                for chunk in _iter_row_chunks(arrays, batch_size):
+                    cursor.executemany(query, chunk)
+                    rows += len(chunk)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            if synchronous is not None:
+                cursor.execute("PRAGMA synchronous = %d" % synchronous)
+            cursor.close()
+    finally:
+        if release is not None:
+            release()
+    return rows
+
+
+def _table_snapshot(name, labels, arrays, keys):
+    """ Returns what is kept of a published table to compute the next delta:
+    its key columns, and 64 bits hashes of its keys and of its rows."""
+    missing = [k for k in keys if k not in labels]
+    if missing:
+        raise ValueError("Unknown key columns {0} for {1}, columns are {2}".format(missing, name, labels))
+    positions = [labels.index(k) for k in keys]
+    frame = _columns_frame(arrays)
+    key_hashes = pd.util.hash_pandas_object(frame.iloc[:, positions], index=False).values
+    if pd.Index(key_hashes).has_duplicates:
+        raise ValueError("{0} has duplicate keys {1}, it cannot be published incrementally".format(name, keys))
+    return {"labels": list(labels),
+            "keys": list(keys),
+            "key_columns": [arrays[p] for p in positions],
+            "key_hashes": key_hashes,
+            "row_hashes": pd.util.hash_pandas_object(frame, index=False).values}
+
+
+def _concat_rows(first, second):
+    if isinstance(first, pd.Categorical) or isinstance(second, pd.Categorical):
+        first, second = np.asarray(first, dtype=object), np.asarray(second, dtype=object)
+    return np.concatenate([first, second])
+
+
+def _table_delta(previous, current):
+    """ Compares two snapshots with vectorized key lookups.
+    Returns the masks of the inserted and changed rows of current, and of the deleted rows of previous."""
+    positions = pd.Index(previous["key_hashes"]).get_indexer(current["key_hashes"])
+    found = positions >= 0
+    inserted = ~found
+    changed = np.zeros(len(positions), dtype=bool)
+    changed[found] = previous["row_hashes"].take(positions[found]) != current["row_hashes"][found]
+    deleted = np.ones(len(previous["key_hashes"]), dtype=bool)
+    deleted[positions[found]] = False
+    return inserted, changed, deleted
+
+
+def _publish_delta(con, table, labels, arrays, keys, state, batch_size=10000, bulk=False):
+    """ Publishes the rows of compact columns inserted, changed or deleted since the snapshot
+    of the table kept in state, see OplModel.publish_delta. Returns the row counts."""
+    current = _table_snapshot(table, labels, arrays, keys)
+    previous = state.get(table, None)
+    if previous is None or previous["labels"] != current["labels"] or previous["keys"] != current["keys"]:
+        rows = _publish_columns(con, table, labels, arrays, batch_size, True, bulk)
+        state[table] = current
+        return {"inserted": rows, "updated": 0, "deleted": 0}
+    inserted, changed, deleted = _table_delta(previous, current)
+    written = inserted | changed
+    removed_keys = [_concat_rows(_take_rows(a, deleted), _take_rows(b, changed))
+                    for a, b in zip(previous["key_columns"], current["key_columns"])]
+    _publish_columns(con, table, labels, [_take_rows(a, written) for a in arrays], batch_size,
+                     False, bulk, (current["keys"], removed_keys))
+    state[table] = current
+    return {"inserted": int(inserted.sum()), "updated": int(changed.sum()), "deleted": int(deleted.sum())}
+
+
+def _publish_job(con, table, labels, arrays, batch_size, clear, bulk):
+    if callable(con) and not hasattr(con, "cursor") and not hasattr(con, "raw_connection"):
+        # a connection factory: one connection per job
+        raw = con()
+        try:
+            return _publish_columns(raw, table, labels, arrays, batch_size, clear, bulk)
+        finally:
+            raw.close()
+    return _publish_columns(con, table, labels, arrays, batch_size, clear, bulk)
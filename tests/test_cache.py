@@ -0,0 +1,94 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from doopl.cache import InputCache, _input_fingerprint
+
+
+def dictionary_table(indices, dictionary):
+    array = pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(dictionary))
+    return pa.table({"name": array})
+
+
+def test_fingerprint_same_content():
+    first = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+    second = pd.DataFrame({"id": [1, 2], "name": ["a", "b"]})
+    assert _input_fingerprint(first) == _input_fingerprint(second)
+
+
+def test_fingerprint_changed_content():
+    first = pd.DataFrame({"id": [1, 2], "qty": [1.0, 2.0]})
+    second = pd.DataFrame({"id": [1, 2], "qty": [1.0, 3.0]})
+    assert _input_fingerprint(first) != _input_fingerprint(second)
+
+
+def test_fingerprint_object_types():
+    numbers = pd.DataFrame({"name": pd.Series([1, 2], dtype=object)})
+    strings = pd.DataFrame({"name": ["1", "2"]})
+    assert _input_fingerprint(numbers) != _input_fingerprint(strings)
+    mixed = pd.DataFrame({"name": pd.Series([1, "2"], dtype=object)})
+    swapped = pd.DataFrame({"name": pd.Series(["1", 2], dtype=object)})
+    assert _input_fingerprint(mixed) != _input_fingerprint(swapped)
+
+
+def test_fingerprint_arrow_dictionaries():
+    first = dictionary_table([0, 1, 0], ["A", "B"])
+    second = dictionary_table([0, 1, 0], ["X", "Y"])
+    assert _input_fingerprint(first) != _input_fingerprint(second)
+    assert _input_fingerprint(first) == _input_fingerprint(dictionary_table([0, 1, 0], ["A", "B"]))
+
+
+def test_fingerprint_nested_dictionaries():
+    def table(dictionary):
+        names = pa.DictionaryArray.from_arrays(pa.array([0, 1], type=pa.int32()), pa.array(dictionary))
+        return pa.table({"origin": pa.StructArray.from_arrays([names], ["name"])})
+    assert _input_fingerprint(table(["A", "B"])) != _input_fingerprint(table(["X", "Y"]))
+
+
+def test_no_fingerprint():
+    assert _input_fingerprint([(1, "a")]) is None
+    reader = pa.RecordBatchReader.from_batches(pa.schema([("id", pa.int64())]), [])
+    assert _input_fingerprint(reader) is None
+
+
+def columns(size):
+    return [np.arange(size, dtype=np.int64)]
+
+
+def test_cache_hits_and_misses():
+    cache = InputCache(max_bytes=1000)
+    assert cache.get("a") is None
+    cache.put("a", columns(10))
+    assert cache.get("a")[0].tolist() == list(range(10))
+    assert (cache.hits, cache.misses, len(cache), cache.nbytes) == (1, 1, 1, 80)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = InputCache(max_bytes=200)
+    cache.put("a", columns(10))
+    cache.put("b", columns(10))
+    cache.get("a")
+    cache.put("c", columns(10))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.nbytes == 160
+
+
+def test_cache_skips_large_entries():
+    cache = InputCache(max_bytes=100)
+    cache.put("a", columns(100))
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_cache_clear():
+    cache = InputCache(max_bytes=1000)
+    cache.put("a", columns(10))
+    cache.get("a")
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache), cache.nbytes) == (0, 0, 0, 0)
@@ -0,0 +1,55 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from doopl.columns import OPL_INTEGER, OPL_FLOAT, OPL_STRING, _apply_changes, _row_mask
+
+FIELDS = [OPL_INTEGER, OPL_STRING, OPL_FLOAT]
+
+
+def columns(ids, names, values):
+    return [np.array(ids, dtype=np.int64), pd.Categorical(names), np.array(values, dtype=np.float64)]
+
+
+def rows(bycolumn):
+    return list(zip(*(np.asarray(c, dtype=object).tolist() for c in bycolumn)))
+
+
+def test_row_mask_full_rows():
+    data = columns([1, 2, 3], ["a", "b", "c"], [1.0, 2.0, 3.0])
+    delta = columns([2, 3], ["b", "x"], [2.0, 3.0])
+    assert _row_mask(data, delta, [0, 1, 2]).tolist() == [False, True, False]
+
+
+def test_row_mask_keys():
+    data = columns([1, 2, 3], ["a", "b", "c"], [1.0, 2.0, 3.0])
+    delta = columns([3, 1], ["c", "z"], [9.0, 9.0])
+    assert _row_mask(data, delta, [0, 1]).tolist() == [False, False, True]
+
+
+def test_apply_changes():
+    data = columns([1, 2, 3], ["a", "b", "c"], [1.0, 2.0, 3.0])
+    changes = [("deleted", columns([1], ["a"], [1.0])),
+               ("updated", columns([2], ["b"], [20.0])),
+               ("inserted", columns([4], ["d"], [4.0]))]
+    result = _apply_changes(data, FIELDS, changes, key_positions=[0, 1])
+    assert rows(result) == [(3, "c", 3.0), (2, "b", 20.0), (4, "d", 4.0)]
+    # existing symbol codes are kept
+    assert list(result[1].categories[:3]) == ["a", "b", "c"]
+
+
+def test_apply_changes_does_not_modify_input():
+    data = columns([1, 2], ["a", "b"], [1.0, 2.0])
+    _apply_changes(data, FIELDS, [("deleted", columns([2], ["b"], [2.0]))])
+    assert rows(data) == [(1, "a", 1.0), (2, "b", 2.0)]
+
+
+def test_delete_missing_row_is_ignored():
+    data = columns([1], ["a"], [1.0])
+    result = _apply_changes(data, FIELDS, [("deleted", columns([1], ["a"], [5.0]))])
+    assert rows(result) == [(1, "a", 1.0)]
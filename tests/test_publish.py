@@ -0,0 +1,80 @@
+# --------------------------------------------------------------------------
+# Source file provided under Apache License, Version 2.0, January 2004,
+# http://www.apache.org/licenses/
+# (c) Copyright IBM Corp. 2018
+# --------------------------------------------------------------------------
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from doopl.publish import _publish_delta
+
+LABELS = ["id", "site", "qty"]
+
+
+def columns(ids, sites, quantities):
+    return [np.array(ids, dtype=np.int64), pd.Categorical(sites), np.array(quantities, dtype=np.float64)]
+
+
+@pytest.fixture
+def con():
+    con = sqlite3.connect(":memory:")
+    con.execute("CREATE TABLE t (id INTEGER, site TEXT, qty REAL)")
+    yield con
+    con.close()
+
+
+def content(con):
+    return con.execute("SELECT id, site, qty FROM t ORDER BY id, site").fetchall()
+
+
+def test_first_publication_writes_all_rows(con):
+    con.execute("INSERT INTO t VALUES (9, 'old', 0)")
+    state = {}
+    counts = _publish_delta(con, "t", LABELS, columns([1, 2], ["a", "b"], [1.0, 2.0]), ["id", "site"], state)
+    assert counts == {"inserted": 2, "updated": 0, "deleted": 0}
+    assert content(con) == [(1, "a", 1.0), (2, "b", 2.0)]
+    assert "t" in state
+
+
+def test_delta(con):
+    state = {}
+    keys = ["id", "site"]
+    _publish_delta(con, "t", LABELS, columns([1, 2, 3], ["a", "b", "c"], [1.0, 2.0, 3.0]), keys, state)
+    counts = _publish_delta(con, "t", LABELS, columns([1, 3, 4], ["a", "c", "d"], [1.0, 30.0, 4.0]), keys, state)
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 1}
+    assert content(con) == [(1, "a", 1.0), (3, "c", 30.0), (4, "d", 4.0)]
+    counts = _publish_delta(con, "t", LABELS, columns([1, 3, 4], ["a", "c", "d"], [1.0, 30.0, 4.0]), keys, state)
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0}
+
+
+def test_delta_to_and_from_empty_table(con):
+    state = {}
+    _publish_delta(con, "t", LABELS, columns([], [], []), ["id"], state)
+    assert content(con) == []
+    counts = _publish_delta(con, "t", LABELS, columns([1, 2], ["a", "b"], [1.0, 2.0]), ["id"], state)
+    assert counts == {"inserted": 2, "updated": 0, "deleted": 0}
+    counts = _publish_delta(con, "t", LABELS, columns([], [], []), ["id"], state)
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 2}
+    assert content(con) == []
+
+
+def test_changed_keys_or_labels_publish_all_rows(con):
+    state = {}
+    _publish_delta(con, "t", LABELS, columns([1, 2], ["a", "b"], [1.0, 2.0]), ["id"], state)
+    counts = _publish_delta(con, "t", LABELS, columns([1, 2], ["a", "b"], [1.0, 2.0]), ["id", "site"], state)
+    assert counts == {"inserted": 2, "updated": 0, "deleted": 0}
+    labels = ["id", "site", "quantity"]
+    counts = _publish_delta(con, "t", labels, columns([1], ["a"], [5.0]), ["id", "site"], state)
+    assert counts == {"inserted": 1, "updated": 0, "deleted": 0}
+    assert content(con) == [(1, "a", 5.0)]
+
+
+def test_duplicate_or_unknown_keys(con):
+    with pytest.raises(ValueError):
+        _publish_delta(con, "t", LABELS, columns([1, 1], ["a", "b"], [1.0, 2.0]), ["id"], {})
+    with pytest.raises(ValueError):
+        _publish_delta(con, "t", LABELS, columns([1], ["a"], [1.0]), ["name"], {})